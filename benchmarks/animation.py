@@ -0,0 +1,99 @@
+"""
+benchmarks rendering an alluvial animation with alluvial_animation against regenerating a full
+alluvial figure per frame. Runs headless with the Agg backend and writes a GIF (or MP4 if ffmpeg is available)
+
+usage: python benchmarks/animation.py [n_frames] [n_nodes]
+"""
+import matplotlib
+matplotlib.use('Agg')
+
+from matplotlib.animation import FFMpegWriter, PillowWriter
+import matplotlib.pyplot as plt
+import pylluvial as pa
+import pandas as pd
+import numpy as np
+import tempfile
+import time
+import sys
+import io
+import os
+
+
+def generate_states(
+    n_nodes: int = 20000,
+    n_timepoints: int = 5,
+    resolutions: tuple[int, ...] = (6, 10, 14, 18, 22),
+    seed: int = 0
+) -> list[pd.DataFrame]:
+    """
+    generates one data table per clustering resolution. Nodes follow a random walk over the
+    timepoints and are clustered into the given number of quantile bins at each timepoint
+
+    :param n_nodes:         number of nodes (alluvia)
+    :param n_timepoints:    number of timepoints (groups in x)
+    :param resolutions:     number of clusters per state
+    :param seed:            seed for the random number generator
+
+    :return:                list of pandas.DataFrames with columns nodename, timepoint and module
+    """
+    rng = np.random.default_rng(seed)
+    walk = np.cumsum(rng.normal(size = (n_timepoints, n_nodes)), axis = 0)
+    states = []
+    for nclusters in resolutions:
+        modules = [
+            np.searchsorted(np.quantile(w, np.linspace(0, 1, nclusters + 1)[1:-1]), w)
+            for w in walk
+        ]
+        states.append(
+            pd.DataFrame(
+                {
+                    'nodename': np.tile(np.arange(n_nodes), n_timepoints),
+                    'timepoint': np.repeat([f't{i}' for i in range(n_timepoints)], n_nodes),
+                    'module': np.concatenate(modules)
+                }
+            )
+        )
+
+    return states
+
+
+def main(n_frames: int = 100, n_nodes: int = 20000) -> None:
+    states = generate_states(n_nodes = n_nodes)
+    frames_per_transition = max((n_frames - 1) // (len(states) - 1), 1)
+    kwargs = dict(x = 'timepoint', stratum = 'module', alluvium = 'nodename', order = 'barycenter')
+
+    start = time.perf_counter()
+    fig, animation = pa.alluvial_animation(
+        states,
+        frames_per_transition = frames_per_transition,
+        **kwargs
+    )
+    setup = time.perf_counter() - start
+
+    writer, suffix = (FFMpegWriter(fps = 25), '.mp4') if FFMpegWriter.isAvailable() else (PillowWriter(fps = 25), '.gif')
+    nframes = (len(states) - 1) * frames_per_transition + 1
+    with tempfile.TemporaryDirectory() as tmpdir:
+        start = time.perf_counter()
+        animation.save(os.path.join(tmpdir, f'animation{suffix}'), writer = writer)
+        render = time.perf_counter() - start
+
+    plt.close(fig)
+
+    # baseline: regenerate the full figure for a few frames and extrapolate
+    nbaseline = 5
+    start = time.perf_counter()
+    for data in (states * nbaseline)[:nbaseline]:
+        fig, ax = pa.alluvial(data = data, **kwargs)
+        fig.savefig(io.BytesIO(), format = 'png')
+        plt.close(fig)
+
+    baseline = (time.perf_counter() - start) / nbaseline
+
+    print(f'{n_nodes} nodes, {len(states)} states, {nframes} frames written as {suffix}')
+    print(f'alluvial_animation setup:      {setup:8.2f} s')
+    print(f'alluvial_animation render:     {render:8.2f} s ({nframes / render:.1f} frames/s)')
+    print(f'full figure per frame (est.):  {baseline * nframes:8.2f} s ({1 / baseline:.1f} frames/s)')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,58 @@
+"""
+benchmarks crossing count vs. runtime of the stratum ordering methods in pylluvial.order
+on synthetic flow matrices with a hidden low-crossing layout that is shuffled before ordering
+
+usage: python benchmarks/order.py [n_strata] [n_levels]
+"""
+from pylluvial.order import barycenter_order, sifting_order, count_crossings
+import numpy as np
+import time
+import sys
+
+
+def generate_weights(
+    n_strata: int,
+    n_levels: int,
+    bandwidth: float = 0.02,
+    seed: int = 0
+) -> list[np.ndarray]:
+    """
+    generates flow weight matrices between n_levels groups of n_strata strata each, where
+    flows mostly connect strata with close positions in a hidden layout. Strata are shuffled afterwards
+
+    :param n_strata:    number of strata per group
+    :param n_levels:    number of groups
+    :param bandwidth:   spread of flows around the hidden layout
+    :param seed:        seed for the random number generator
+
+    :return:            list of weight matrices
+    """
+    rng = np.random.default_rng(seed)
+    positions = np.linspace(0, 1, n_strata)
+    weights = []
+    for _ in range(n_levels - 1):
+        distance = positions[:, None] - positions[None, :]
+        w = np.exp(-(distance / bandwidth) ** 2) * rng.random((n_strata, n_strata))
+        w[w < 1e-3] = 0
+        weights.append(w / w.sum())
+
+    permutations = [rng.permutation(n_strata) for _ in range(n_levels)]
+    return [
+        w[np.ix_(p1, p2)] for w, p1, p2 in zip(weights, permutations[:-1], permutations[1:])
+    ]
+
+
+def main(n_strata: int = 500, n_levels: int = 10) -> None:
+    weights = generate_weights(n_strata, n_levels)
+    print(f'{n_strata} strata x {n_levels} levels')
+    print(f'{"method":<12}{"crossings":>14}{"seconds":>10}')
+    print(f'{"label":<12}{count_crossings(weights):>14.6f}{0:>10.3f}')
+    for name, method in [('barycenter', barycenter_order), ('sifting', sifting_order)]:
+        start = time.perf_counter()
+        orders = method(weights)
+        runtime = time.perf_counter() - start
+        print(f'{name:<12}{count_crossings(weights, orders):>14.6f}{runtime:>10.3f}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,58 @@
+"""
+benchmarks the runtime of counting strata and flows of a large pandas.DataFrame with an increasing
+number of processes (n_jobs) and reports the speedup relative to sequential counting
+
+usage: python benchmarks/parallel.py [n_alluvia] [n_timepoints] [max_jobs]
+"""
+from pylluvial.aggregate import prepare_data, count_data
+import pandas as pd
+import numpy as np
+import time
+import sys
+import os
+
+
+def generate_data(
+    n_alluvia: int,
+    n_timepoints: int,
+    n_strata: int = 30,
+    seed: int = 0
+) -> pd.DataFrame:
+    """
+    generates data with n_alluvia nodes that are assigned to random strata at each timepoint.
+    Rows are shuffled such that the groups in x are not contiguous
+
+    :param n_alluvia:       number of nodes (alluvia)
+    :param n_timepoints:    number of timepoints (groups in x)
+    :param n_strata:        number of strata per timepoint
+    :param seed:            seed for the random number generator
+
+    :return:                pandas.DataFrame with columns nodename, timepoint and module
+    """
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(
+        {
+            'nodename': np.tile(np.arange(n_alluvia), n_timepoints),
+            'timepoint': np.repeat([f't{i:02d}' for i in range(n_timepoints)], n_alluvia),
+            'module': rng.integers(0, n_strata, n_alluvia * n_timepoints)
+        }
+    )
+    return data.sample(frac = 1, random_state = seed, ignore_index = True)
+
+
+def main(n_alluvia: int = 500000, n_timepoints: int = 20, max_jobs: int = os.cpu_count()) -> None:
+    data = prepare_data(generate_data(n_alluvia, n_timepoints), 'timepoint', 'nodename', 'module')
+    print(f'{len(data)} rows, {n_timepoints} timepoints, {os.cpu_count()} cores')
+    print(f'{"n_jobs":>7}{"seconds":>10}{"speedup":>10}')
+    n_jobs, sequential = 1, None
+    while n_jobs <= max_jobs:
+        start = time.perf_counter()
+        count_data(data, 'timepoint', 'nodename', 'module', n_jobs = n_jobs)
+        runtime = time.perf_counter() - start
+        sequential = sequential or runtime
+        print(f'{n_jobs:>7}{runtime:>10.2f}{sequential / runtime:>10.2f}')
+        n_jobs *= 2
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
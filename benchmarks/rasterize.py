@@ -0,0 +1,82 @@
+"""
+benchmarks file size and savefig time of vector (PDF, SVG) output with vector flows, flows rasterized
+with the resolution of savefig and flows rasterized into a separate image with flow_dpi = 200 for an
+increasing number of strata per group
+
+usage: python benchmarks/rasterize.py [n_nodes] [n_timepoints]
+"""
+import matplotlib
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import pylluvial as pa
+import pandas as pd
+import numpy as np
+import time
+import sys
+import io
+
+
+def generate_data(
+    n_strata: int,
+    n_nodes: int = 20000,
+    n_timepoints: int = 6,
+    seed: int = 0
+) -> pd.DataFrame:
+    """
+    generates data with n_strata strata per timepoint. Nodes start at random positions, follow a
+    small random walk over the timepoints and are assigned to quantile bins of their position at each timepoint
+
+    :param n_strata:        number of strata per timepoint
+    :param n_nodes:         number of nodes (alluvia)
+    :param n_timepoints:    number of timepoints (groups in x)
+    :param seed:            seed for the random number generator
+
+    :return:                pandas.DataFrame with columns nodename, timepoint and module
+    """
+    rng = np.random.default_rng(seed)
+    walk = rng.normal(size = n_nodes) + np.cumsum(0.05 * rng.normal(size = (n_timepoints, n_nodes)), axis = 0)
+    modules = [
+        np.searchsorted(np.quantile(w, np.linspace(0, 1, n_strata + 1)[1:-1]), w)
+        for w in walk
+    ]
+    return pd.DataFrame(
+        {
+            'nodename': np.tile(np.arange(n_nodes), n_timepoints),
+            'timepoint': np.repeat([f't{i}' for i in range(n_timepoints)], n_nodes),
+            'module': np.concatenate(modules)
+        }
+    )
+
+
+def main(n_nodes: int = 20000, n_timepoints: int = 6) -> None:
+    modes = {
+        'vector': dict(rasterize_flows = False),
+        'raster': dict(rasterize_flows = True),
+        'dpi200': dict(rasterize_flows = True, flow_dpi = 200)
+    }
+    print(f'{"strata":>7}{"format":>8}{"mode":>8}{"size [kB]":>12}{"savefig [s]":>13}')
+    for n_strata in [10, 20, 40, 80]:
+        data = generate_data(n_strata, n_nodes = n_nodes, n_timepoints = n_timepoints)
+        for mode, kwargs in modes.items():
+            fig, ax = plt.subplots(figsize = (10, 5))
+            pa.alluvial(
+                x = 'timepoint',
+                stratum = 'module',
+                alluvium = 'nodename',
+                data = data,
+                ax = ax,
+                **kwargs
+            )
+            for fmt in ['pdf', 'svg']:
+                buffer = io.BytesIO()
+                start = time.perf_counter()
+                fig.savefig(buffer, format = fmt)
+                runtime = time.perf_counter() - start
+                print(f'{n_strata:>7}{fmt:>8}{mode:>8}{buffer.tell() / 1024:>12.1f}{runtime:>13.2f}')
+
+            plt.close(fig)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
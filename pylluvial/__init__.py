@@ -2,7 +2,9 @@ __version__ = '1.1.0'
 
 from .utils import (
     generate_test_data,
-    to_dataframe
+    to_dataframe,
+    ColorMapper
 )
 
-from .plot import alluvial
\ No newline at end of file
+from .plot import alluvial
+from .animate import alluvial_animation
\ No newline at end of file
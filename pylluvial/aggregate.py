@@ -1,8 +1,136 @@
 from .stratum import Stratum
 from .utils import pairwise, groupby
+from .parallel import count_codes
+from .tables import (
+    is_native_table,
+    prepare_lazyframe,
+    count_strata_polars,
+    count_transitions_polars,
+    collect_all
+)
 import numpy as np
 import pandas as pd
-from typing import Any
+from typing import Any, Optional
+
+
+def prepare_data(
+    data: Any,
+    x: str,
+    alluvium: str,
+    stratum: str,
+    hue: Optional[str] = None
+) -> Any:
+    """
+    selects the columns needed for plotting and adds a grouping column holding the original stratum.
+    If hue is given, strata are split by hue such that each stratum is named '<stratum>_<hue>'.
+    Rows with missing values are dropped. polars and pyarrow tables are kept as polars.LazyFrame
+    such that aggregation runs natively
+
+    :param data:        pandas.DataFrame, polars.DataFrame, polars.LazyFrame or pyarrow.Table in long format
+    :param x:           categorical column on which to split the data along the x axis
+    :param alluvium:    column from which to compute lode sizes for each stratum
+    :param stratum:     column specifying the strata for each column in x
+    :param hue:         column on which to split each stratum or None
+
+    :return:            pandas.DataFrame or polars.LazyFrame
+    """
+    if is_native_table(data):
+        return prepare_lazyframe(data, x, alluvium, stratum, hue = hue)
+
+    columns = [x, alluvium, stratum] + ([hue] if hue else [])
+    data = data[columns].dropna(subset = columns)
+    if hue:
+        for col in [stratum, hue]:
+            data[col] = data[col].astype(str)
+
+        data['grouping'] = data[stratum]
+        data[stratum] = data[[stratum, hue]].agg('_'.join, axis = 1)
+
+    else:
+        data['grouping'] = data[stratum]
+
+    return data
+
+
+def count_data(
+    data: Any,
+    x: str,
+    alluvium: str,
+    stratum: str,
+    hue: Optional[str] = None,
+    n_jobs: Optional[int] = None
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    counts the number of alluvia in each stratum of each group in x and the number of alluvia flowing
+    between each pair of strata in successive groups. polars.LazyFrames are counted natively with polars,
+    pandas.DataFrames are counted on integer codes in parallel if n_jobs > 1 (see count_codes)
+
+    :param data:        data as returned by prepare_data
+    :param x:           categorical column on which to split the data along the x axis
+    :param alluvium:    column from which to compute lode sizes for each stratum
+    :param stratum:     column specifying the strata for each column in x
+    :param hue:         column on which strata were split or None
+    :param n_jobs:      number of processes used for pandas.DataFrames (see get_n_jobs)
+
+    :return:            pandas.DataFrame with columns x, stratum, grouping, (hue), count and level sorted by x and
+                        stratum, where level gives the index of each group in x, and pandas.DataFrame with columns
+                        level, source, target and count, where level gives the index of the target group
+    """
+    if is_native_table(data):
+        strata_counts, transitions = collect_all(
+            [
+                count_strata_polars(data, x, stratum, hue = hue),
+                count_transitions_polars(data, x, alluvium, stratum)
+            ]
+        )
+        return strata_counts, transitions
+
+    return count_codes(data, x, alluvium, stratum, hue = hue, n_jobs = n_jobs)
+
+
+def get_lodes_from_counts(
+    strata_counts: pd.DataFrame,
+    transitions: pd.DataFrame,
+    x: str,
+    stratum: str
+) -> list[list[np.ndarray]]:
+    """
+    computes lode widths from stratum and transition counts (see get_lodes for the format of the result)
+
+    :param strata_counts:   stratum counts as returned by count_data
+    :param transitions:     transition counts as returned by count_data
+    :param x:               categorical column on which the data was split along the x axis
+    :param stratum:         column specifying the strata for each column in x
+
+    :return:                nested list of numpy.ndarrays
+    """
+    groups = [group for _, group in groupby(strata_counts, 'level')]
+    lodes = []
+    for level, (g1, g2) in enumerate(pairwise(groups), 1):
+        flows = transitions[transitions['level'] == level]
+        sources = pd.Index(g1[stratum]).get_indexer(flows['source'])
+        targets = pd.Index(g2[stratum]).get_indexer(flows['target'])
+        if (sources < 0).any() or (targets < 0).any():
+            raise ValueError(
+                f'transitions of level {level} contain strata that are missing in the stratum counts'
+            )
+
+        counts = np.zeros((len(g1), len(g2)))
+        np.add.at(
+            counts,
+            (sources, targets),
+            flows['count'].to_numpy()
+        )
+        relative_widths = np.stack(
+            [
+                counts / g1['count'].to_numpy()[:, None],
+                counts / g2['count'].to_numpy()[None, :]
+            ],
+            axis = 2
+        )
+        lodes.append(list(relative_widths))
+
+    return lodes
 
 
 def get_lodes(
@@ -20,71 +148,72 @@ def get_lodes(
     of this array denote the width of the lode as a fraction of stratum j in i (first column)
     or of stratum k in i+1 (second column)
 
-    :param data:        pandas.DataFrame
+    :param data:        data as returned by prepare_data
     :param x:           categorical column on which to group data
     :param alluvium:    column on which to compute flows
     :param stratum:     categorical column on which to group x groups
-    :param hue:         grouping variable on which to split each stratum
 
     :return:            nested list of numpy.ndarrays
     """
 
-    lodes = []
-    for (_, g1), (_, g2) in pairwise(groupby(data, x)):
-        flows = []
-        for _, g1_strat in groupby(g1, stratum):
-            strat_flows = []
-            for _, g2_strat in groupby(g2, stratum):
-                flow = g2_strat[g2_strat[alluvium].isin(g1_strat[alluvium])]
-                strat_flows.append(
-                    [len(flow) / len(strat) for strat in [g1_strat, g2_strat]]
-                )
-
-            flows.append(
-                np.array(strat_flows)
-            )
-        lodes.append(flows)
-
-    return lodes
+    return get_lodes_from_counts(
+        *count_data(data, x, alluvium, stratum),
+        x,
+        stratum
+    )
 
 
 def aggregate_data(
-    data: pd.DataFrame,
+    data: Any,
     x: str,
     alluvium: str,
-    stratum: str
+    stratum: str,
+    counts: Optional[tuple[pd.DataFrame, pd.DataFrame]] = None,
+    n_jobs: Optional[int] = None
 ) -> tuple[list[list[Stratum]], list[list[np.ndarray]], list[Any], list[list[Any]]]:
     """
-    computes the strata and lodes for each categorical column in x
+    computes the strata and lodes for each categorical column in x. Only the stratum and
+    transition counts are computed on data, such that polars and pyarrow tables are never
+    converted to pandas
 
-    :param data:        pandas.DataFrame containing data in long format (see generate_test_data)
-    :param x:           categorical column on which to split the data along the x axis
-    :param alluvium:    column from which to compute lode sizes for each stratum
-    :param stratum:     column specifying the strata for each column in x
+    :param data:            data in long format as returned by prepare_data
+    :param x:               categorical column on which to split the data along the x axis
+    :param alluvium:        column from which to compute lode sizes for each stratum
+    :param stratum:         column specifying the strata for each column in x
+    :param counts:          precomputed result of count_data or None
+    :param n_jobs:          number of processes used for counting (see count_data)
 
-    :return:            list of lists Stratum objects, lode sizes as list of lists of arrays with
-                        l[i][j] = lodesizes relative to strata in i and i + 1
-                        see also function `get_lodes` for more context
+    :return:                list of lists Stratum objects, lode sizes as list of lists of arrays with
+                            l[i][j] = lodesizes relative to strata in i and i + 1
+                            see also function `get_lodes` for more context
     """
 
-    strata_by_group, group_labels, strata_groupings = [], [], []
-    for group_label, group in groupby(data, x):
-        group_labels.append(group_label)
-        strata, strat_grouping = [], []
-        for label, strat in groupby(group, stratum):
-            strata.append(
-                Stratum(len(strat) / len(group), 0, 0, label)
-            )
-            strat_grouping.append(
-                strat.grouping.unique()
-            )
-        strata_by_group.append(strata)
-        strata_groupings.append(strat_grouping)
-
-    lodes = get_lodes(
+    strata_counts, transitions = counts if counts is not None else count_data(
         data,
         x,
         alluvium,
+        stratum,
+        n_jobs = n_jobs
+    )
+
+    strata_by_group, group_labels, strata_groupings = [], [], []
+    for _, group in groupby(strata_counts, 'level'):
+        group_labels.append(group[x].iloc[0])
+        group_size = group['count'].sum()
+        strata_by_group.append(
+            [
+                Stratum(count / group_size, 0, 0, label)
+                for label, count in zip(group[stratum], group['count'])
+            ]
+        )
+        strata_groupings.append(
+            group['grouping'].tolist()
+        )
+
+    lodes = get_lodes_from_counts(
+        strata_counts,
+        transitions,
+        x,
         stratum
     )
 
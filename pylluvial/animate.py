@@ -0,0 +1,297 @@
+from .utils import *
+from .aggregate import aggregate_data, prepare_data, count_data
+from .order import order_strata
+from .plot import get_flow_vertices, layout_strata, style_axes
+from matplotlib.animation import FuncAnimation
+from matplotlib.collections import PolyCollection
+import matplotlib.pyplot as plt
+import numpy as np
+
+
+def get_state_geometry(
+    data: Any,
+    x: str,
+    stratum: str,
+    alluvium: str,
+    hue: Optional[str] = None,
+    stratum_width: float = 2,
+    stratum_gap: float = 1,
+    plot_height: float = 100,
+    plot_width: float = 150,
+    order: Optional[str] = None,
+    n_jobs: Optional[int] = None
+) -> tuple[dict[tuple, np.ndarray], dict[tuple, np.ndarray], pd.DataFrame, dict[Hashable, float]]:
+    """
+    computes the layout of a single alluvial state without plotting it
+
+    :param data:            data in long format (see alluvial)
+    :param x:               column to use for grouping of data
+    :param stratum:         column to use for computing strata heights
+    :param alluvium:        column to use for computing flows between strata
+    :param hue:             column to use for computing Stratum splits or None
+    :param stratum_width:   width of the stratum rectangles
+    :param stratum_gap:     gap between strata in a group
+    :param plot_height:     height of the plot
+    :param plot_width:      width of the plot
+    :param order:           None, 'barycenter' or 'sifting' (see alluvial)
+    :param n_jobs:          number of processes used for counting (see alluvial)
+
+    :return:                stratum vertices keyed by (group_name, stratum_name), vertices of nonzero flows keyed by
+                            (group_name, stratum_name, next_group_name, next_stratum_name), stratum counts and
+                            dictionary of the form {group_name: x position}
+    """
+    data = prepare_data(data, x, alluvium, stratum, hue = hue)
+    counts = count_data(data, x, alluvium, stratum, hue = hue, n_jobs = n_jobs)
+    strata, lodes, group_labels, groupings = aggregate_data(
+        data,
+        x,
+        alluvium,
+        stratum,
+        counts = counts
+    )
+    if order:
+        strata, lodes, groupings = order_strata(strata, lodes, groupings, method = order)
+
+    positions = layout_strata(
+        strata,
+        groupings,
+        stratum_width,
+        stratum_gap,
+        plot_height,
+        plot_width
+    )
+
+    stratum_vertices = {
+        (group_label, s.label): np.array(s.get_vertices())
+        for group_label, group_strata in zip(group_labels, strata)
+        for s in group_strata
+    }
+
+    flow_vertices = {}
+    for (i, g1_strats), (_, g2_strats) in pairwise(enumerate(strata)):
+        for j, g1_strat in enumerate(g1_strats):
+            for k, g2_strat in enumerate(g2_strats):
+                g1_rh, g2_rh = lodes[i][j][k]
+                if not g1_rh:
+                    continue
+
+                key = (group_labels[i], g1_strat.label, group_labels[i + 1], g2_strat.label)
+                flow_vertices[key] = get_flow_vertices(g1_strat, g2_strat, g1_rh, g2_rh)
+
+        reset_strata(g2_strats)
+
+    return stratum_vertices, flow_vertices, counts[0], dict(zip(group_labels, positions))
+
+
+def collapse_vertices(vertices: np.ndarray) -> np.ndarray:
+    """
+    collapses the vertices of a stratum or flow polygon onto its vertical center line
+
+    :param vertices:    numpy.ndarray of shape n x 2 holding an upper path followed by the reversed lower path
+
+    :return:            numpy.ndarray of shape n x 2 describing a polygon with zero height
+    """
+    n = len(vertices) // 2
+    center = (vertices[:n] + vertices[n:][::-1]) / 2
+    return np.concatenate([center, center[::-1]])
+
+
+def stack_vertices(
+    geometries: list[dict[tuple, np.ndarray]]
+) -> tuple[list[tuple], np.ndarray, np.ndarray]:
+    """
+    stacks the polygon vertices of several states into a single array with a fixed set of polygons.
+    Polygons missing in a state are collapsed in place of the closest state they occur in,
+    such that they grow or shrink when interpolating between states
+
+    :param geometries:  list of dictionaries of the form {key: vertices} for each state
+
+    :return:            list of polygon keys, array of shape n_states x n_polygons x n_vertices x 2 and
+                        boolean array of shape n_states x n_polygons indicating if a polygon is present in a state
+    """
+    keys = list(dict.fromkeys(key for geometry in geometries for key in geometry))
+    present = np.array(
+        [[key in geometry for key in keys] for geometry in geometries]
+    ).reshape(len(geometries), len(keys))
+    nvertices = max((len(v) for geometry in geometries for v in geometry.values()), default = 0)
+    vertices = np.empty((len(geometries), len(keys), nvertices, 2))
+    for j, key in enumerate(keys):
+        states = np.flatnonzero(present[:, j])
+        for i, geometry in enumerate(geometries):
+            if present[i, j]:
+                vertices[i, j] = geometry[key]
+
+            else:
+                nearest = states[np.argmin(np.abs(states - i))]
+                vertices[i, j] = collapse_vertices(geometries[nearest][key])
+
+    return keys, vertices, present
+
+
+def merge_colors(
+    color_dicts: list[dict[Hashable, dict[Hashable, Any]]]
+) -> dict[Hashable, dict[Hashable, Any]]:
+    """
+    merges the color dictionaries of several states. If a stratum has different colors in
+    different states the color of the first state it occurs in is used
+
+    :param color_dicts: list of dictionaries of the form {group_name: {stratum_name: color}}
+
+    :return:            dictionary of the form {group_name: {stratum_name: color}}
+    """
+    colors = {}
+    for color_dict in color_dicts[::-1]:
+        for group_name, group_colors in color_dict.items():
+            colors.setdefault(group_name, {}).update(group_colors)
+
+    return colors
+
+
+def alluvial_animation(
+    states: list[Any],
+    x: str,
+    stratum: str,
+    alluvium: str,
+    palette: Union[str, dict, ColorMapper] = 'husl',
+    hue: Optional[str] = None,
+    ax: Optional[plt.Axes] = None,
+    stratum_width: float = 2,
+    stratum_gap: float = 1,
+    plot_height: float = 100,
+    plot_width: float = 150,
+    show_labels: bool = False,
+    order: Optional[str] = None,
+    n_jobs: Optional[int] = None,
+    frames_per_transition: int = 25,
+    interval: float = 40,
+    blit: bool = True
+) -> Union[FuncAnimation, tuple[plt.Figure, FuncAnimation]]:
+    """
+    generate an animation of the transitions between several alluvial states, e.g. the cluster assignments
+    for a range of clustering resolutions. The layout of each state is computed once and the flows and strata
+    are drawn as two fixed polygon collections whose vertices are interpolated between successive states.
+    Strata and flows that only exist in some states grow from or shrink to zero height
+
+    :param states:                  list of data tables in long format, one per state (see data in alluvial).
+                                    All states have to contain the same groups in x
+    :param x:                       string denoting the column to use for grouping of data
+    :param stratum:                 string denoting the column to use for computing strata heights
+    :param alluvium:                string denoting the column to use for computing flows between strata
+    :param palette:                 string denoting a given seaborn palette, dictionary of the form
+                                    {'group_name': {'statum_name': 'color'}} or ColorMapper. Strings are
+                                    mapped with a ColorMapper such that strata keep their color in all states
+    :param hue:                     string denoting the column to use for computing Stratum splits
+    :param ax:                      matplotlib.Axes object to generate the animation in
+    :param stratum_width:           width of the stratum rectangles to plot
+    :param stratum_gap:             gap between strata in a group
+    :param plot_height:             height of the generated plot
+    :param plot_width:              width of the generated plot
+    :param show_labels:             if True shows group names on the x axis
+    :param order:                   None, 'barycenter' or 'sifting' (see alluvial). Strata are ordered per state
+    :param n_jobs:                  number of processes used for counting (see alluvial)
+    :param frames_per_transition:   number of frames used for the transition between two successive states
+    :param interval:                delay between frames in milliseconds
+    :param blit:                    if True only the flows and strata are redrawn in each frame when the animation
+                                    is shown interactively. FuncAnimation.save always redraws the full figure, so
+                                    blit has no effect on saved MP4 or GIF files
+
+    :return:                        matplotlib.animation.FuncAnimation if ax is given else matplotlib.Figure,
+                                    matplotlib.animation.FuncAnimation
+    """
+    if not len(states):
+        raise ValueError('states has to contain at least one data table')
+
+    return_fig = False
+    if not ax:
+        fig, ax = plt.subplots()
+        return_fig = True
+
+    geometries = [
+        get_state_geometry(
+            data,
+            x,
+            stratum,
+            alluvium,
+            hue = hue,
+            stratum_width = stratum_width,
+            stratum_gap = stratum_gap,
+            plot_height = plot_height,
+            plot_width = plot_width,
+            order = order,
+            n_jobs = n_jobs
+        )
+        for data in states
+    ]
+
+    group_labels = list(geometries[0][3])
+    for i, (_, _, _, positions) in enumerate(geometries[1:], 1):
+        if list(positions) != group_labels:
+            raise ValueError(
+                f'all states have to contain the same groups in x, state {i} has groups {list(positions)} '
+                f'but state 0 has groups {group_labels}'
+            )
+
+    if isinstance(palette, dict):
+        colors = palette
+
+    else:
+        mapper = palette if isinstance(palette, ColorMapper) else ColorMapper(palette)
+        colors = merge_colors(
+            [mapper(strata_counts, x, stratum, hue = hue) for _, _, strata_counts, _ in geometries]
+        )
+
+    strata_keys, strata_vertices, strata_present = stack_vertices([g[0] for g in geometries])
+    flow_keys, flow_vertices, flow_present = stack_vertices([g[1] for g in geometries])
+
+    linewidth = plt.rcParams['patch.linewidth']
+    strata_collection = PolyCollection(
+        strata_vertices[0],
+        facecolors = [colors[group_name][stratum_name] for group_name, stratum_name in strata_keys],
+        edgecolors = 'white',
+        animated = blit
+    )
+    flow_collection = PolyCollection(
+        flow_vertices[0],
+        facecolors = [colors[group_name][stratum_name] for group_name, stratum_name, _, _ in flow_keys],
+        edgecolors = 'white',
+        animated = blit
+    )
+    ax.add_collection(strata_collection)
+    ax.add_collection(flow_collection)
+    artists = [
+        (strata_collection, strata_vertices, strata_present),
+        (flow_collection, flow_vertices, flow_present)
+    ]
+
+    def update(frame: int) -> tuple[PolyCollection, PolyCollection]:
+        state, step = divmod(frame, frames_per_transition)
+        next_state = min(state + 1, len(states) - 1)
+        t = step / frames_per_transition
+        t = t * t * (3 - 2 * t)
+        for collection, vertices, present in artists:
+            collection.set_verts((1 - t) * vertices[state] + t * vertices[next_state])
+            collection.set_linewidths(
+                np.where(present[state] | present[next_state], linewidth, 0)
+            )
+
+        return strata_collection, flow_collection
+
+    positions = geometries[0][3]
+    if show_labels:
+        ax.set_xticks(list(positions.values()))
+        ax.set_xticklabels(list(positions.keys()))
+
+    ax.set_xlim(0, max(positions.values()) + stratum_width / 2)
+    ax.set_ylim(0, plot_height)
+    style_axes(ax, show_labels)
+
+    animation = FuncAnimation(
+        ax.figure,
+        update,
+        frames = (len(states) - 1) * frames_per_transition + 1,
+        init_func = lambda: update(0),
+        interval = interval,
+        blit = blit
+    )
+
+    return animation if not return_fig else (fig, animation)
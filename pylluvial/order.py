@@ -0,0 +1,300 @@
+from .stratum import Stratum
+import numpy as np
+from typing import Any, Optional
+
+
+def get_weight_matrices(
+    strata: list[list[Stratum]],
+    lodes: list[list[np.ndarray]]
+) -> list[np.ndarray]:
+    """
+    converts lodes into flow weight matrices. w[i][j, k] gives the width of the flow
+    between stratum j of group i and stratum k of group i + 1 as a fraction of group i
+
+    :param strata:  list of lists of Stratum objects
+    :param lodes:   list of lists of numpy.ndarrays holding the Stratum flow proportions (see also get_lodes)
+
+    :return:        list of 2D numpy.ndarrays of shape n_i x n_i+1
+    """
+    weights = []
+    for group_strata, group_lodes in zip(strata, lodes):
+        heights = np.array([s.relative_height for s in group_strata])
+        widths = np.array([lode[:, 0] for lode in group_lodes])
+        weights.append(widths * heights[:, None])
+
+    return weights
+
+
+def get_level_sizes(weights: list[np.ndarray]) -> list[int]:
+    """
+    returns the number of strata in each group given the weight matrices between groups
+
+    :param weights: list of weight matrices as returned by get_weight_matrices
+
+    :return:        list of integers
+    """
+    return [weights[0].shape[0]] + [w.shape[1] for w in weights]
+
+
+def pair_crossings(w: np.ndarray) -> float:
+    """
+    computes the weighted number of crossings between two ordered groups of strata. Two flows
+    (j, k) and (j', k') cross if j < j' and k > k' and contribute w[j, k] * w[j', k'] to the total
+
+    :param w:   weight matrix of shape n_i x n_i+1 with rows and columns in plotting order
+
+    :return:    weighted crossing count
+    """
+    above = np.cumsum(w, axis = 0) - w
+    above_right = np.cumsum(above[:, ::-1], axis = 1)[:, ::-1] - above
+    return float((w * above_right).sum())
+
+
+def count_crossings(
+    weights: list[np.ndarray],
+    orders: Optional[list[np.ndarray]] = None
+) -> float:
+    """
+    computes the total weighted number of crossings of an alluvial diagram
+
+    :param weights: list of weight matrices as returned by get_weight_matrices
+    :param orders:  list of arrays giving the plotting order of the strata in each group. If None the original order is used
+
+    :return:        weighted crossing count summed over all pairs of successive groups
+    """
+    if orders is None:
+        return sum(pair_crossings(w) for w in weights)
+
+    return sum(
+        pair_crossings(w[np.ix_(o1, o2)]) for w, o1, o2 in zip(weights, orders[:-1], orders[1:])
+    )
+
+
+def get_positions(order: np.ndarray) -> np.ndarray:
+    """
+    computes the position of each stratum in a given order normalized to [0, 1]
+
+    :param order:   array of stratum indices in plotting order
+
+    :return:        array of positions indexed by stratum
+    """
+    positions = np.empty(len(order))
+    positions[order] = np.linspace(0, 1, len(order))
+    return positions
+
+
+def barycenter_sort(
+    w: np.ndarray,
+    fixed_order: np.ndarray,
+    free_order: np.ndarray
+) -> np.ndarray:
+    """
+    orders the strata of a group by the weighted mean position of the strata they share flows with
+    in a neighbouring group. Strata without flows to the neighbouring group keep their position
+
+    :param w:           weight matrix of shape n_fixed x n_free
+    :param fixed_order: plotting order of the neighbouring group
+    :param free_order:  current plotting order of the group to sort
+
+    :return:            new plotting order of the group
+    """
+    free_positions = get_positions(free_order)
+    total = w.sum(axis = 0)
+    barycenters = np.divide(
+        get_positions(fixed_order) @ w,
+        total,
+        out = free_positions.copy(),
+        where = total > 0
+    )
+    return np.lexsort((free_positions, barycenters))
+
+
+def barycenter_order(
+    weights: list[np.ndarray],
+    n_sweeps: int = 4,
+    orders: Optional[list[np.ndarray]] = None
+) -> list[np.ndarray]:
+    """
+    reduces flow crossings by alternating downward and upward barycenter sweeps over the groups.
+    returns the orders with the fewest crossings seen
+
+    :param weights:     list of weight matrices as returned by get_weight_matrices
+    :param n_sweeps:    number of down and up sweeps to perform
+    :param orders:      initial plotting orders. If None the original order is used
+
+    :return:            list of arrays giving the plotting order of the strata in each group
+    """
+    if orders is None:
+        orders = [np.arange(n) for n in get_level_sizes(weights)]
+
+    orders = list(orders)
+    best_orders, best_crossings = list(orders), count_crossings(weights, orders)
+    for _ in range(n_sweeps):
+        for i in range(1, len(orders)):
+            orders[i] = barycenter_sort(weights[i - 1], orders[i - 1], orders[i])
+
+        for i in range(len(orders) - 2, -1, -1):
+            orders[i] = barycenter_sort(weights[i].T, orders[i + 1], orders[i])
+
+        crossings = count_crossings(weights, orders)
+        if crossings < best_crossings:
+            best_orders, best_crossings = list(orders), crossings
+
+    return best_orders
+
+
+def get_crossing_matrix(
+    w: np.ndarray,
+    neighbour_order: np.ndarray
+) -> np.ndarray:
+    """
+    computes the pairwise crossing matrix of a group with respect to an ordered neighbouring group.
+    c[u, v] gives the weighted number of crossings between the flows of u and v if u is placed above v
+
+    :param w:               weight matrix of shape n_group x n_neighbour
+    :param neighbour_order: plotting order of the neighbouring group
+
+    :return:                2D numpy.ndarray of shape n_group x n_group
+    """
+    w = w[:, neighbour_order]
+    preceding = np.cumsum(w, axis = 1) - w
+    return w @ preceding.T
+
+
+def sift_level(
+    c: np.ndarray,
+    order: np.ndarray
+) -> np.ndarray:
+    """
+    moves each stratum of a group to the position that minimizes its crossings given the order
+    of the remaining strata. Strata are sifted in order of decreasing total crossing weight
+
+    :param c:       pairwise crossing matrix as returned by get_crossing_matrix
+    :param order:   current plotting order of the group
+
+    :return:        new plotting order of the group
+    """
+    order = order.copy()
+    positions = np.empty_like(order)
+    positions[order] = np.arange(len(order))
+    c = c - np.diag(np.diag(c))
+    for v in np.argsort(-(c.sum(axis = 0) + c.sum(axis = 1)), kind = 'stable'):
+        # cost[p] gives the crossings of v if inserted before the stratum at position p
+        cost = np.cumsum(c[order, v] - c[v, order])
+        source = positions[v]
+        target = np.argmin(np.concatenate([[0], cost]))
+        if target > source:
+            target -= 1
+            order[source:target] = order[source + 1:target + 1]
+
+        else:
+            order[target + 1:source + 1] = order[target:source]
+
+        order[target] = v
+        positions[order] = np.arange(len(order))
+
+    return order
+
+
+def sifting_order(
+    weights: list[np.ndarray],
+    n_sweeps: int = 1,
+    orders: Optional[list[np.ndarray]] = None
+) -> list[np.ndarray]:
+    """
+    reduces flow crossings by sifting the strata of each group in down and up sweeps.
+    If no initial orders are given the result of barycenter_order is used as a starting point
+
+    :param weights:     list of weight matrices as returned by get_weight_matrices
+    :param n_sweeps:    number of down and up sweeps to perform
+    :param orders:      initial plotting orders. If None barycenter_order is used to compute them
+
+    :return:            list of arrays giving the plotting order of the strata in each group
+    """
+    orders = list(barycenter_order(weights) if orders is None else orders)
+    nlevels = len(orders)
+    for _ in range(n_sweeps):
+        for i in [*range(nlevels), *range(nlevels - 2, -1, -1)]:
+            c = np.zeros((len(orders[i]), len(orders[i])))
+            if i > 0:
+                c += get_crossing_matrix(weights[i - 1].T, orders[i - 1])
+
+            if i < nlevels - 1:
+                c += get_crossing_matrix(weights[i], orders[i + 1])
+
+            orders[i] = sift_level(c, orders[i])
+
+    return orders
+
+
+def get_blocks(grouping: list[Any]) -> tuple[np.ndarray, list[np.ndarray]]:
+    """
+    assigns each stratum of a group to the block of strata sharing its grouping
+
+    :param grouping:    list of grouping labels of the strata in a group
+
+    :return:            array of block indices for each stratum and list of stratum indices for each block
+    """
+    block_ids = {}
+    blocks = np.array(
+        [block_ids.setdefault(tuple(np.atleast_1d(g)), len(block_ids)) for g in grouping]
+    )
+    members = [np.flatnonzero(blocks == b) for b in range(len(block_ids))]
+    return blocks, members
+
+
+ORDER_METHODS = {
+    'barycenter': barycenter_order,
+    'sifting': sifting_order
+}
+
+
+def order_strata(
+    strata: list[list[Stratum]],
+    lodes: list[list[np.ndarray]],
+    groupings: list[list[Any]],
+    method: str = 'barycenter'
+) -> tuple[list[list[Stratum]], list[list[np.ndarray]], list[list[Any]]]:
+    """
+    reorders the strata of each group and the lodes within each stratum to reduce the weighted number
+    of flow crossings. Strata sharing a grouping (e.g. when using hue) are moved together as a block
+
+    :param strata:      list of lists of Stratum objects
+    :param lodes:       list of lists of numpy.ndarrays holding the Stratum flow proportions (see also get_lodes)
+    :param groupings:   list of list of group labels indicating a grouping of the Stratum objects for each group
+    :param method:      either 'barycenter' or 'sifting'
+
+    :return:            reordered strata, lodes and groupings
+    """
+    if method not in ORDER_METHODS:
+        raise ValueError(
+            f'order must be one of {list(ORDER_METHODS)} but got {method!r}'
+        )
+
+    if len(strata) < 2:
+        return strata, lodes, groupings
+
+    blocks, members = zip(*[get_blocks(grouping) for grouping in groupings])
+    block_weights = []
+    for w, b1, b2, m1, m2 in zip(
+            get_weight_matrices(strata, lodes),
+            blocks[:-1], blocks[1:],
+            members[:-1], members[1:]
+    ):
+        r1 = np.eye(len(m1))[b1]
+        r2 = np.eye(len(m2))[b2]
+        block_weights.append(r1.T @ w @ r2)
+
+    orders = [
+        np.concatenate([group_members[b] for b in block_order])
+        for block_order, group_members in zip(ORDER_METHODS[method](block_weights), members)
+    ]
+
+    strata = [[group_strata[j] for j in o] for group_strata, o in zip(strata, orders)]
+    groupings = [[grouping[j] for j in o] for grouping, o in zip(groupings, orders)]
+    lodes = [
+        [group_lodes[j][o2] for j in o1]
+        for group_lodes, o1, o2 in zip(lodes, orders[:-1], orders[1:])
+    ]
+
+    return strata, lodes, groupings
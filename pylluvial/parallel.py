@@ -0,0 +1,443 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+import pandas as pd
+import os
+from typing import Any, Callable, Optional
+
+
+# shared code array of the current worker process of the process pool (see init_worker)
+worker_state = {}
+
+
+def get_n_jobs(n_jobs: Optional[int] = None) -> int:
+    """
+    computes the number of processes to use following the joblib convention
+
+    :param n_jobs:  None or 1 for sequential processing, number of processes if > 1 or -k to use all but
+                    k - 1 cores (e.g. -1 uses all cores, -2 all but one). At least one process is used
+
+    :return:        number of processes
+    """
+    if n_jobs is None:
+        return 1
+
+    if not isinstance(n_jobs, (int, np.integer)) or n_jobs == 0:
+        raise ValueError(f'n_jobs has to be None or a nonzero integer, got {n_jobs!r}')
+
+    if n_jobs < 0:
+        return max(os.cpu_count() + 1 + n_jobs, 1)
+
+    return int(n_jobs)
+
+
+def init_worker(
+    name: str,
+    shape: tuple[int, int]
+) -> None:
+    """
+    attaches a worker process of the process pool to the shared memory block holding the codes. Only used
+    as initializer of the process pool, sequential runs pass the codes to the task functions directly
+
+    :param name:    name of the shared memory block holding the codes
+    :param shape:   shape of the codes array
+
+    :return:        None
+    """
+    worker_state['shm'] = SharedMemory(name = name)
+    worker_state['codes'] = np.ndarray(shape, dtype = np.int64, buffer = worker_state['shm'].buf)
+
+
+def run_on_shared_codes(
+    func: Callable,
+    *args: Any
+) -> Any:
+    """
+    runs a task function on the shared codes of the current worker process
+
+    :param func:    task function taking the codes as first argument
+    :param args:    remaining arguments of func
+
+    :return:        result of func
+    """
+    return func(worker_state['codes'], *args)
+
+
+def encode_chunk(
+    codes: np.ndarray,
+    start: int,
+    x_values: pd.Series,
+    stratum_values: pd.Series,
+    alluvium_values: pd.Series,
+    alluvium_offset: Optional[int] = None
+) -> tuple[pd.Index, np.ndarray, pd.Index, np.ndarray, Optional[pd.Index]]:
+    """
+    factorizes x, stratum and alluvium of a chunk of rows and stores the chunk local codes in rows 0, 1 and 3
+    of codes. Dense integer alluvium labels are used as global codes directly by subtracting alluvium_offset
+
+    :param codes:           array of shape 4 x n holding x, stratum, row order and alluvium codes
+    :param start:           first row of the chunk
+    :param x_values:        x labels of the chunk
+    :param stratum_values:  stratum labels of the chunk
+    :param alluvium_values: alluvium labels of the chunk
+    :param alluvium_offset: smallest alluvium label if alluvium labels are dense integers else None
+
+    :return:                unique x labels of the chunk, number of rows per x label, unique stratum labels of
+                            the chunk, row index of the first occurrence of each stratum label and unique
+                            alluvium labels of the chunk or None if alluvium_offset is given
+    """
+    stop = start + len(x_values)
+    x_codes, x_uniques = pd.factorize(x_values)
+    stratum_codes, stratum_uniques = pd.factorize(stratum_values)
+    codes[0, start:stop] = x_codes
+    codes[1, start:stop] = stratum_codes
+
+    alluvium_uniques = None
+    if alluvium_offset is None:
+        codes[3, start:stop], alluvium_uniques = pd.factorize(alluvium_values)
+
+    else:
+        codes[3, start:stop] = alluvium_values.to_numpy(dtype = np.int64) - alluvium_offset
+
+    first_occurrence = np.empty(len(stratum_uniques), dtype = np.int64)
+    first_occurrence[stratum_codes[::-1]] = np.arange(stop - 1, start - 1, -1)
+
+    return (
+        x_uniques,
+        np.bincount(x_codes, minlength = len(x_uniques)),
+        stratum_uniques,
+        first_occurrence,
+        alluvium_uniques
+    )
+
+
+def partition_chunk(
+    codes: np.ndarray,
+    start: int,
+    stop: int,
+    x_mapping: np.ndarray,
+    stratum_mapping: np.ndarray,
+    alluvium_mapping: Optional[np.ndarray],
+    destinations: np.ndarray
+) -> None:
+    """
+    maps the chunk local codes of a chunk of rows to global codes and writes the row indices of the chunk,
+    stably sorted by x, to their positions in the x partitioned row order in row 2 of codes
+
+    :param codes:               array of shape 4 x n holding x, stratum, row order and alluvium codes
+    :param start:               first row of the chunk
+    :param stop:                last row of the chunk (exclusive)
+    :param x_mapping:           global x code of each chunk local x code
+    :param stratum_mapping:     global stratum code of each chunk local stratum code
+    :param alluvium_mapping:    global alluvium code of each chunk local alluvium code or None if the
+                                alluvium codes are global already
+    :param destinations:        position of the first row of the chunk in each group of x in the row order
+
+    :return:                    None
+    """
+    codes[1, start:stop] = stratum_mapping[codes[1, start:stop]]
+    if alluvium_mapping is not None:
+        codes[3, start:stop] = alluvium_mapping[codes[3, start:stop]]
+
+    x_codes = x_mapping[codes[0, start:stop]]
+
+    # radix sort on small integer codes
+    order = np.argsort(x_codes.astype(np.min_scalar_type(len(destinations))), kind = 'stable')
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(x_codes, minlength = len(destinations)))])
+    for destination, first, last in zip(destinations, bounds[:-1], bounds[1:]):
+        codes[2, destination:destination + last - first] = order[first:last] + start
+
+
+def count_pair_transitions(
+    source_alluvia: np.ndarray,
+    source_strata: np.ndarray,
+    target_alluvia: np.ndarray,
+    target_strata: np.ndarray,
+    nstrata: int,
+    nalluvia: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    counts the alluvia flowing between each pair of strata of two successive groups in x by joining the
+    groups on alluvium. Each row of the target group is counted once for every distinct source stratum
+    containing its alluvium
+
+    :param source_alluvia:  alluvium codes of the source group
+    :param source_strata:   stratum codes of the source group
+    :param target_alluvia:  alluvium codes of the target group
+    :param target_strata:   stratum codes of the target group
+    :param nstrata:         total number of strata
+    :param nalluvia:        total number of alluvium codes
+
+    :return:                source stratum codes, target stratum codes and counts of all nonzero flows
+    """
+    lookup = np.full(nalluvia, -1, dtype = np.int64)
+    lookup[source_alluvia] = source_strata
+    if (lookup[source_alluvia] == source_strata).all():
+        # each alluvium is in a single source stratum
+        sources = lookup[target_alluvia]
+        flows = sources >= 0
+        sources, targets = sources[flows], target_strata[flows]
+
+    else:
+        # expand each target row to all distinct source strata of its alluvium
+        pairs = np.unique(source_alluvia * nstrata + source_strata)
+        pair_alluvia = pairs // nstrata
+        first = np.searchsorted(pair_alluvia, target_alluvia, side = 'left')
+        matches = np.searchsorted(pair_alluvia, target_alluvia, side = 'right') - first
+        ends = np.cumsum(matches)
+        positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(first - ends + matches, matches)
+        sources = pairs[positions] % nstrata
+        targets = np.repeat(target_strata, matches)
+
+    pairs, counts = np.unique(
+        sources * nstrata + targets,
+        return_counts = True
+    )
+    return pairs // nstrata, pairs % nstrata, counts
+
+
+def count_level(
+    codes: np.ndarray,
+    start: int,
+    stop: int,
+    previous_start: Optional[int],
+    nstrata: int,
+    nalluvia: int
+) -> tuple[np.ndarray, Optional[tuple[np.ndarray, np.ndarray, np.ndarray]]]:
+    """
+    counts the number of alluvia per stratum in a group in x and the flows from the previous group
+
+    :param codes:           array of shape 4 x n holding x, stratum, row order and alluvium codes
+    :param start:           position of the first row of the group in the row order
+    :param stop:            position of the last row of the group in the row order (exclusive)
+    :param previous_start:  position of the first row of the previous group in the row order or None
+    :param nstrata:         total number of strata
+    :param nalluvia:        total number of alluvium codes
+
+    :return:                array of counts indexed by stratum code and flows from the previous group
+                            (see count_pair_transitions) or None
+    """
+    rows = codes[2, start:stop]
+    strata = codes[1, rows]
+    if previous_start is None:
+        return np.bincount(strata, minlength = nstrata), None
+
+    previous_rows = codes[2, previous_start:start]
+    transitions = count_pair_transitions(
+        codes[3, previous_rows],
+        codes[1, previous_rows],
+        codes[3, rows],
+        strata,
+        nstrata,
+        nalluvia
+    )
+    return np.bincount(strata, minlength = nstrata), transitions
+
+
+def run_tasks(
+    tasks: list[tuple[Callable, tuple]],
+    codes: np.ndarray,
+    executor: Optional[ProcessPoolExecutor] = None
+) -> list[Any]:
+    """
+    runs a list of tasks on the codes in a process pool or sequentially if executor is None. Worker
+    processes use their shared memory view of codes (see init_worker)
+
+    :param tasks:       list of (func, args) tuples where func takes the codes as first argument
+    :param codes:       array of shape 4 x n holding x, stratum, row order and alluvium codes
+    :param executor:    concurrent.futures.ProcessPoolExecutor initialized with init_worker or None
+
+    :return:            list of task results
+    """
+    if executor is None:
+        return [func(codes, *args) for func, args in tasks]
+
+    futures = [executor.submit(run_on_shared_codes, func, *args) for func, args in tasks]
+    return [future.result() for future in futures]
+
+
+def merge_uniques(
+    uniques: list[pd.Index],
+    sort: bool = True
+) -> tuple[pd.Index, list[np.ndarray]]:
+    """
+    merges the chunk local labels of all chunks into global labels
+
+    :param uniques: list of chunk local labels as returned by encode_chunk
+    :param sort:    whether to sort the global labels
+
+    :return:        global labels and the global code of each chunk local label for each chunk
+    """
+    # empty chunks would change the dtype of the labels
+    nonempty = [u for u in uniques if len(u)] or uniques[:1]
+    codes, labels = pd.factorize(nonempty[0].append(nonempty[1:]), sort = sort)
+    return labels, np.split(codes, np.cumsum([len(u) for u in uniques])[:-1])
+
+
+def concatenate(arrays: list[np.ndarray]) -> np.ndarray:
+    """
+    concatenates a possibly empty list of integer arrays
+
+    :param arrays:  list of 1D numpy.ndarrays
+
+    :return:        1D numpy.ndarray
+    """
+    return np.concatenate([np.empty(0, dtype = np.int64), *arrays])
+
+
+def get_alluvium_range(alluvia: pd.Series) -> Optional[tuple[int, int]]:
+    """
+    checks if the alluvium labels are dense integers that can be used as codes without factorizing them
+
+    :param alluvia: alluvium column of the data
+
+    :return:        smallest label and number of codes if the labels are dense integers else None
+    """
+    if not len(alluvia) or not pd.api.types.is_integer_dtype(alluvia):
+        return None
+
+    low, high = int(alluvia.min()), int(alluvia.max())
+    return (low, high - low + 1) if high - low < 2 * len(alluvia) else None
+
+
+def count_codes(
+    data: pd.DataFrame,
+    x: str,
+    alluvium: str,
+    stratum: str,
+    hue: Optional[str] = None,
+    n_jobs: Optional[int] = None
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    computes stratum and transition counts of a pandas.DataFrame from integer codes. The rows are split into
+    one chunk per process, which are factorized and partitioned by x in parallel. Only the labels of each chunk
+    are merged in the main process. Afterwards the stratum counts and the flows from the previous group are
+    computed for each group in x in parallel. The codes are kept in shared memory, such that each chunk of the
+    data is sent to a worker process only once for encoding
+
+    :param data:        pandas.DataFrame as returned by prepare_data without missing values
+    :param x:           categorical column on which to split the data along the x axis
+    :param alluvium:    column from which to compute lode sizes for each stratum
+    :param stratum:     column specifying the strata for each column in x
+    :param hue:         column on which strata were split or None
+    :param n_jobs:      number of processes to use (see get_n_jobs). None or 1 runs sequentially
+
+    :return:            stratum counts and transition counts (see count_data)
+    """
+    n_jobs = get_n_jobs(n_jobs)
+    shape = (4, len(data))
+    alluvium_range = get_alluvium_range(data[alluvium])
+    shm = SharedMemory(create = True, size = max(8 * shape[0] * shape[1], 1)) if n_jobs > 1 else None
+    executor = ProcessPoolExecutor(
+        max_workers = n_jobs,
+        initializer = init_worker,
+        initargs = (shm.name, shape)
+    ) if shm else None
+
+    try:
+        codes = np.ndarray(shape, dtype = np.int64, buffer = shm.buf) if shm else np.empty(shape, dtype = np.int64)
+        with executor or nullcontext():
+            chunks = np.linspace(0, len(data), n_jobs + 1).astype(int)
+            encoded = run_tasks(
+                [
+                    (
+                        encode_chunk,
+                        (
+                            start,
+                            data[x].iloc[start:stop],
+                            data[stratum].iloc[start:stop],
+                            data[alluvium].iloc[start:stop],
+                            alluvium_range[0] if alluvium_range else None
+                        )
+                    )
+                    for start, stop in zip(chunks[:-1], chunks[1:])
+                ],
+                codes,
+                executor = executor
+            )
+            x_uniques, x_counts, stratum_uniques, first_occurrences, alluvium_uniques = zip(*encoded)
+            x_labels, x_mappings = merge_uniques(x_uniques)
+            stratum_labels, stratum_mappings = merge_uniques(stratum_uniques)
+            nstrata = len(stratum_labels)
+            if alluvium_range:
+                nalluvia = alluvium_range[1]
+                alluvium_mappings = [None] * len(encoded)
+
+            else:
+                alluvium_labels, alluvium_mappings = merge_uniques(alluvium_uniques, sort = False)
+                nalluvia = len(alluvium_labels)
+
+            # destinations[c, i] is the position of the first row of chunk c in group i of the row order
+            chunk_sizes = np.zeros((len(x_counts), len(x_labels)), dtype = np.int64)
+            for sizes, mapping, counts in zip(chunk_sizes, x_mappings, x_counts):
+                sizes[mapping] = counts
+
+            offsets = np.concatenate([[0], np.cumsum(chunk_sizes.sum(axis = 0))])
+            destinations = offsets[:-1] + np.cumsum(chunk_sizes, axis = 0) - chunk_sizes
+            run_tasks(
+                [
+                    (partition_chunk, args)
+                    for args in zip(
+                        chunks[:-1],
+                        chunks[1:],
+                        x_mappings,
+                        stratum_mappings,
+                        alluvium_mappings,
+                        destinations
+                    )
+                ],
+                codes,
+                executor = executor
+            )
+
+            results = run_tasks(
+                [
+                    (count_level, (start, stop, previous_start, nstrata, nalluvia))
+                    for previous_start, start, stop
+                    in zip([None, *offsets[:-2]], offsets[:-1], offsets[1:])
+                ],
+                codes,
+                executor = executor
+            )
+
+    finally:
+        if shm:
+            codes = None
+            shm.close()
+            shm.unlink()
+
+    first_occurrence = np.empty(nstrata, dtype = np.int64)
+    for mapping, rows in zip(stratum_mappings, first_occurrences):
+        first_occurrence[mapping] = rows
+
+    level_counts = [counts for counts, _ in results]
+    pair_counts = [transitions for _, transitions in results[1:]]
+
+    nonzero = [np.flatnonzero(counts) for counts in level_counts]
+    strata_idx = concatenate(nonzero)
+    strata_counts = pd.DataFrame(
+        {
+            x: x_labels.take(np.repeat(np.arange(len(nonzero)), [len(nz) for nz in nonzero])),
+            stratum: stratum_labels.take(strata_idx)
+        }
+    )
+    for col in ['grouping'] + ([hue] if hue else []):
+        strata_counts[col] = data[col].to_numpy()[first_occurrence[strata_idx]]
+
+    strata_counts['count'] = concatenate(
+        [counts[nz] for counts, nz in zip(level_counts, nonzero)]
+    )
+    strata_counts['level'] = np.repeat(np.arange(len(nonzero)), [len(nz) for nz in nonzero])
+
+    sources, targets, counts = [concatenate(arrays) for arrays in zip(*pair_counts)] or [concatenate([])] * 3
+    transitions = pd.DataFrame(
+        {
+            'level': np.repeat(np.arange(1, len(pair_counts) + 1), [len(c) for _, _, c in pair_counts]),
+            'source': stratum_labels.take(sources),
+            'target': stratum_labels.take(targets),
+            'count': counts
+        }
+    )
+
+    return strata_counts, transitions
@@ -1,7 +1,12 @@
 from .utils import *
-from .aggregate import aggregate_data
+from .aggregate import aggregate_data, prepare_data, count_data
+from .order import order_strata
 from .fit import *
 from matplotlib.patches import Polygon
+from matplotlib.collections import PolyCollection
+from matplotlib.figure import Figure
+from matplotlib.image import AxesImage
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from typing import Hashable, Optional
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -50,6 +55,35 @@ def get_flow_path(
     return xs, ys
 
 
+def get_flow_vertices(
+    g1_strat: Stratum,
+    g2_strat: Stratum,
+    g1_rh: float,
+    g2_rh: float
+) -> np.ndarray:
+    """
+    computes the vertices of the polygon outlining a given alluvial flow. The upper path of
+    the flow is followed by the reversed lower path
+
+    :param g1_strat:    origin Stratum object
+    :param g2_strat:    destination Stratum object
+    :param g1_rh:       flow proportion of origin Stratum
+    :param g2_rh:       flow proportion of destination Stratum
+
+    :return:            numpy.ndarray of shape n x 2
+    """
+    y1_bottom, y1_top = g1_strat.get_flow_ycoords(g1_rh)
+    y2_bottom, y2_top = g2_strat.get_flow_ycoords(g2_rh)
+    x1 = g1_strat.get_right_bound(0.5)
+    x2 = g2_strat.get_left_bound(0.5)
+    x_bottom, y_bottom = get_flow_path(y1_bottom, y2_bottom, x1, x2)
+    x_top, y_top = get_flow_path(y1_top, y2_top, x1, x2)
+    x = np.concatenate([x_top, x_bottom[::-1]])
+    y = np.concatenate([y_top, y_bottom[::-1]])
+
+    return np.array([x, y]).T
+
+
 def make_flow_polygon(
     g1_strat: Stratum,
     g2_strat: Stratum,
@@ -70,16 +104,8 @@ def make_flow_polygon(
 
     :return:            matplotlib.patches.Polygon for flow between origin and destination Stratum
     """
-    y1_bottom, y1_top = g1_strat.get_flow_ycoords(g1_rh)
-    y2_bottom, y2_top = g2_strat.get_flow_ycoords(g2_rh)
-    x1 = g1_strat.get_right_bound(0.5)
-    x2 = g2_strat.get_left_bound(0.5)
-    x_bottom, y_bottom = get_flow_path(y1_bottom, y2_bottom, x1, x2)
-    x_top, y_top = get_flow_path(y1_top, y2_top, x1, x2)
-    x = np.concatenate([x_top, x_bottom[::-1]])
-    y = np.concatenate([y_top, y_bottom[::-1]])
     flow_polygon = Polygon(
-        np.array([x, y]).T,
+        get_flow_vertices(g1_strat, g2_strat, g1_rh, g2_rh),
         facecolor = color,
         edgecolor = 'white',
         alpha = alpha
@@ -88,31 +114,23 @@ def make_flow_polygon(
     return flow_polygon
 
 
-def plot_group_strata(
+def layout_group_strata(
     group_strata: list[Stratum],
     x: float,
     grouping: list[Any],
-    colors: dict[Hashable, Union[str, tuple[float, float, float, float]]],
-    ax: plt.Axes,
     gapsize: float = 1,
     height: float = 100,
-    width: float = 0.5,
-    alpha: float = 1,
-    show_labels: bool = False
+    width: float = 0.5
 ) -> None:
     """
-    plots stratas for a given group
+    sets position and size of the strata of a given group
 
     :param group_strata:    list of Stratum objects
     :param x:               position of group column on x axis
     :param grouping:        list of integers indicating strata that should not have a gap between them
-    :param colors:          dictionary of the form {stratum_name: color}
-    :param ax:              matplotlib.Axes object to add the strata patches to
     :param gapsize:         size of gap between each pair of rectangles
     :param height:          height of the group column
-    :param width:           width of the plotted rectangles
-    :param alpha:           opacity of plotted rectangles
-    :param show_labels:     if True, plots Stratum labels
+    :param width:           width of the rectangles
 
     :return:                None
     """
@@ -125,25 +143,125 @@ def plot_group_strata(
             key = lambda x: x[1]
     ):
         for stratum, _ in strat_group:
-            c = colors[stratum.label]
             stratum.set_height(height, norm)
             stratum.set_width(width)
             stratum.set_xy(x, y)
-            ax.add_patch(
-                stratum.get_patch(c, alpha)
-            )
-            if show_labels:
-                ax.text(
-                    *stratum.get_label(),
-                    rotation = 90,
-                    ha = 'center',
-                    va = 'center'
-                )
             y += stratum.height
 
         y += gapsize
 
 
+def layout_strata(
+    strata: list[list[Stratum]],
+    groupings: list[list[Any]],
+    stratum_width: float,
+    stratum_gap: float,
+    plot_height: float,
+    plot_width: float
+) -> list[float]:
+    """
+    sets position and size of the strata of each group without plotting them
+
+    :param strata:          list of lists of Stratum objects
+    :param groupings:       list of list of group labels indicating a grouping of the Stratum objects for each group
+    :param stratum_width:   width of the Stratum rectangles
+    :param stratum_gap      size of the gap between strata
+    :param plot_height:     height of the groups
+    :param plot_width:      width of the plot
+
+    :return:                list of x positions of the groups
+    """
+    positions = [stratum_width / 2 + i * plot_width / len(strata) for i in range(len(strata))]
+    for group_strata, grouping, x in zip(strata, groupings, positions):
+        layout_group_strata(
+            group_strata,
+            x,
+            grouping,
+            gapsize = stratum_gap,
+            height = plot_height,
+            width = stratum_width
+        )
+
+    return positions
+
+
+def draw_group_strata(
+    group_strata: list[Stratum],
+    colors: dict[Hashable, Union[str, tuple[float, float, float, float]]],
+    ax: plt.Axes,
+    alpha: float = 1,
+    show_labels: bool = False
+) -> None:
+    """
+    adds the patches of already positioned strata of a given group to ax
+
+    :param group_strata:    list of Stratum objects (see layout_group_strata)
+    :param colors:          dictionary of the form {stratum_name: color}
+    :param ax:              matplotlib.Axes object to add the strata patches to
+    :param alpha:           opacity of plotted rectangles
+    :param show_labels:     if True, plots Stratum labels
+
+    :return:                None
+    """
+    for stratum in group_strata[::-1]:
+        c = colors[stratum.label]
+        ax.add_patch(
+            stratum.get_patch(c, alpha)
+        )
+        if show_labels:
+            ax.text(
+                *stratum.get_label(),
+                rotation = 90,
+                ha = 'center',
+                va = 'center'
+            )
+
+
+def plot_group_strata(
+    group_strata: list[Stratum],
+    x: float,
+    grouping: list[Any],
+    colors: dict[Hashable, Union[str, tuple[float, float, float, float]]],
+    ax: plt.Axes,
+    gapsize: float = 1,
+    height: float = 100,
+    width: float = 0.5,
+    alpha: float = 1,
+    show_labels: bool = False
+) -> None:
+    """
+    plots stratas for a given group
+
+    :param group_strata:    list of Stratum objects
+    :param x:               position of group column on x axis
+    :param grouping:        list of integers indicating strata that should not have a gap between them
+    :param colors:          dictionary of the form {stratum_name: color}
+    :param ax:              matplotlib.Axes object to add the strata patches to
+    :param gapsize:         size of gap between each pair of rectangles
+    :param height:          height of the group column
+    :param width:           width of the plotted rectangles
+    :param alpha:           opacity of plotted rectangles
+    :param show_labels:     if True, plots Stratum labels
+
+    :return:                None
+    """
+    layout_group_strata(
+        group_strata,
+        x,
+        grouping,
+        gapsize = gapsize,
+        height = height,
+        width = width
+    )
+    draw_group_strata(
+        group_strata,
+        colors,
+        ax,
+        alpha = alpha,
+        show_labels = show_labels
+    )
+
+
 def plot_strata(
     strata: list[list[Stratum]],
     group_labels: list[str],
@@ -173,76 +291,173 @@ def plot_strata(
     :return:                None
     """
 
-    x = stratum_width / 2
-    label_positions = []
-    for group_label, group_strata, grouping in zip(group_labels, strata, groupings):
-        colors = strat_colors[group_label]
-        label_positions.append(x)
-        plot_group_strata(
+    label_positions = layout_strata(
+        strata,
+        groupings,
+        stratum_width,
+        stratum_gap,
+        plot_height,
+        plot_width
+    )
+    for group_label, group_strata in zip(group_labels, strata):
+        draw_group_strata(
             group_strata,
-            x,
-            grouping,
-            colors,
+            strat_colors[group_label],
             ax,
-            gapsize = stratum_gap,
-            height = plot_height,
-            width = stratum_width,
             show_labels = show_labels
         )
-        x += plot_width / len(strata)
 
     if show_labels:
         ax.set_xticks(label_positions)
         ax.set_xticklabels(group_labels)
 
-    ax.set_xlim(0, x - plot_width / len(strata) + stratum_width / 2)
+    ax.set_xlim(0, label_positions[-1] + stratum_width / 2)
     ax.set_ylim(0, plot_height)
 
 
+def make_flow_image(
+    flows: PolyCollection,
+    ax: plt.Axes,
+    dpi: float
+) -> AxesImage:
+    """
+    renders flows into an image with the given resolution that covers the current limits of ax.
+    The size of the image in pixels is computed from the size of ax in the figure at call time
+
+    :param flows:   matplotlib.collections.PolyCollection holding the flows
+    :param ax:      matplotlib.Axes object the flows belong to
+    :param dpi:     resolution of the image
+
+    :return:        matplotlib.image.AxesImage in data coordinates of ax
+    """
+    position = ax.get_position()
+    width, height = ax.figure.get_size_inches() * [position.width, position.height]
+    layer = Figure(figsize = (width, height), dpi = dpi)
+    layer.patch.set_alpha(0)
+    canvas = FigureCanvasAgg(layer)
+    layer_ax = layer.add_axes([0, 0, 1, 1])
+    layer_ax.set_axis_off()
+    layer_ax.set_xlim(ax.get_xlim())
+    layer_ax.set_ylim(ax.get_ylim())
+    layer_ax.add_collection(flows)
+    canvas.draw()
+
+    # interpolation = 'none' embeds the image with its own resolution in vector output
+    image = AxesImage(
+        ax,
+        interpolation = 'none',
+        origin = 'upper',
+        extent = (*ax.get_xlim(), *ax.get_ylim()),
+        zorder = flows.get_zorder()
+    )
+    image.set_data(np.asarray(canvas.buffer_rgba()).copy())
+
+    return image
+
+
 def plot_flows(
     strata: list[list[Stratum]],
     lodes: list[list[np.ndarray]],
-    ax: plt.Axes
+    ax: plt.Axes,
+    rasterized: bool = False,
+    dpi: Optional[float] = None
 ) -> None:
     """
-    plot flows between strata
+    plot flows between strata. By default each flow is added as a separate Polygon patch. If rasterized is True
+    all flows with nonzero width are drawn as a single PolyCollection that is rasterized in vector output or,
+    if dpi is given, as an image with this resolution (see make_flow_image)
 
-    :param strata:  list of lists of Stratum objects
-    :param lodes:   list of lists of numpy.ndarrays holding the Stratum flow proportions (see also get_lodes)
-    :param ax:      matplotlib.Axes object to add the flows to
+    :param strata:      list of lists of Stratum objects
+    :param lodes:       list of lists of numpy.ndarrays holding the Stratum flow proportions (see also get_lodes)
+    :param ax:          matplotlib.Axes object to add the flows to
+    :param rasterized:  if True, flows are drawn as a single raster image in vector output (e.g. PDF or SVG)
+    :param dpi:         resolution of the rasterized flows or None to use the resolution of the saved figure
 
-    :return:        None
+    :return:            None
     """
+    vertices, colors = [], []
     for (i, g1_strats), (_, g2_strats) in pairwise(enumerate(strata)):
         for j, g1_strat in enumerate(g1_strats):
             relative_widths = lodes[i][j]
             for k, g2_strat in enumerate(g2_strats):
-                flow_polygon = make_flow_polygon(
-                    g1_strat,
-                    g2_strat,
-                    relative_widths[k][0],
-                    relative_widths[k][1],
-                    g1_strat.color
-                )
-                ax.add_patch(flow_polygon)
+                if not rasterized:
+                    flow_polygon = make_flow_polygon(
+                        g1_strat,
+                        g2_strat,
+                        relative_widths[k][0],
+                        relative_widths[k][1],
+                        g1_strat.color
+                    )
+                    ax.add_patch(flow_polygon)
+
+                elif relative_widths[k][0]:
+                    vertices.append(
+                        get_flow_vertices(
+                            g1_strat,
+                            g2_strat,
+                            relative_widths[k][0],
+                            relative_widths[k][1]
+                        )
+                    )
+                    colors.append(g1_strat.color)
 
         # reset lode_position for next round
         reset_strata(g2_strats)
 
+    if not rasterized:
+        return
+
+    flows = PolyCollection(
+        vertices,
+        facecolors = colors,
+        edgecolors = 'white',
+        rasterized = True
+    )
+    if dpi:
+        ax.add_image(make_flow_image(flows, ax, dpi))
+
+    else:
+        ax.add_collection(flows)
+
+
+def style_axes(
+    ax: plt.Axes,
+    show_labels: bool
+) -> None:
+    """
+    removes ticks and spines of an alluvial plot
+
+    :param ax:          matplotlib.Axes object holding the plot
+    :param show_labels: if False also removes the group labels on the x axis
+
+    :return:            None
+    """
+    if not show_labels:
+        ax.set_xticks([])
+
+    ax.set_yticks([])
+    for pos in ['top', 'bottom', 'left', 'right']:
+        ax.spines[pos].set_visible(False)
+
 
 def alluvial(
     x: Union[str, Iterable],
     stratum: Union[str, Iterable],
     alluvium: Union[str, Iterable],
-    palette: str = 'husl',
+    palette: Union[str, dict, ColorMapper] = 'husl',
     hue: Optional[Union[str, Iterable]] = None,
-    data: Optional[pd.DataFrame] = None,
+    data: Optional[Any] = None,
     ax: Optional[plt.Axes] = None,
     stratum_width: float = 2,
     stratum_gap: float = 1,
     plot_height: float = 100,
     plot_width: float = 150,
-    show_labels: bool = False
+    show_labels: bool = False,
+    order: Optional[str] = None,
+    stable_colors: bool = False,
+    n_jobs: Optional[int] = None,
+    rasterize_flows: bool = False,
+    flow_dpi: Optional[float] = None
 ) -> Union[plt.Axes, tuple[plt.Figure, plt.Axes]]:
     """
     generate alluvial plot. x, stratum and alluvium are either strings if data is given or iterables of same length
@@ -252,49 +467,80 @@ def alluvial(
     :param x:               string denoting the column to use for grouping of data if data is given else iterable
     :param stratum:         string denoting the column to use for computing stata heights if data is given else iterable
     :param alluvium:        string denoting the column to use for computing flows between strata if data is given else iterable
-    :param palette:         string denoting a given seaborn palette or dictionary of the form {'group_name': {'statum_name': 'color'}}
+    :param palette:         string denoting a given seaborn palette, dictionary of the form {'group_name': {'statum_name': 'color'}}
+                            or ColorMapper to keep colors consistent across several plots
     :param hue:             string denoting the column to use for computing Stratum splits if data else iterable
-    :param data:            pandas.DataFrame containing data in long format
+    :param data:            pandas.DataFrame, polars.DataFrame, polars.LazyFrame or pyarrow.Table containing data
+                            in long format. polars and pyarrow tables are aggregated natively with polars
     :param ax:              matplotlib.Axes object to generate the plot in
     :param stratum_width:   width of the stratum rectangles to plot
     :param stratum_gap:     gap between strata in a group
     :param plot_height:     height of the generated plot
     :param plot_width:      width of the generated plot
     :param show_labels:     if True plots Stratum name with each Stratum
+    :param order:           None to order strata by label or one of 'barycenter' or 'sifting' to reorder strata and lodes
+                            such that flow crossings are reduced (see also order_strata)
+    :param stable_colors:   if True and palette is a string, strata with the same label get the same color in all groups
+    :param n_jobs:          number of processes used to count strata and flows of a pandas.DataFrame. -1 uses all cores,
+                            -k all but k - 1. polars and pyarrow tables always use the multithreaded polars engine
+    :param rasterize_flows: if True, flows are embedded as a single raster image when saving to vector formats like PDF
+                            or SVG, while strata, labels and axes stay vector. Keeps files of large plots small
+    :param flow_dpi:        resolution of the rasterized flows. If None, the flows are rasterized with the resolution
+                            used by savefig, i.e. the dpi argument of savefig, else rcParams['savefig.dpi'] or, if that is
+                            'figure', the dpi of the figure. If given, the flows are rendered into a separate image with
+                            flow_dpi pixels per inch of the current size of ax, independent of savefig and rcParams.
+                            Requires rasterize_flows = True
 
     :return:                matplotlib.Axes if ax is given else matplotlib.Figure, matplotlib.Axes
     """
+    if flow_dpi is not None and not rasterize_flows:
+        raise ValueError('flow_dpi is only used for rasterized flows, set rasterize_flows = True')
+
     return_fig = False
     if not ax:
 
         fig, ax = plt.subplots()
         return_fig = True
 
-    if not isinstance(data, pd.DataFrame):
+    if data is None:
         data = to_dataframe(x, alluvium, stratum, hue = hue)
         x = 'x'
-        stratum = 'stratum',
+        stratum = 'stratum'
         alluvium = 'alluvium'
-        hue = 'hue'
-
-    data = data.copy()
-    if hue:
-        for col in [stratum, hue]:
-            data.loc[:, col] = data.loc[:, col].astype(str)
+        hue = 'hue' if hue is not None else None
 
-        data['grouping'] = data.loc[:, stratum]
-        data.loc[:, stratum] = data[[stratum, hue]].agg('_'.join, axis = 1)
-
-    else:
-        data['grouping'] = data.loc[:, stratum]
+    data = prepare_data(
+        data,
+        x,
+        alluvium,
+        stratum,
+        hue = hue
+    )
+    strata_counts, transitions = count_data(
+        data,
+        x,
+        alluvium,
+        stratum,
+        hue = hue,
+        n_jobs = n_jobs
+    )
 
     if isinstance(palette, str):
         colors = get_color_dict(
-            data,
+            strata_counts,
             x,
             stratum,
             hue = hue,
-            sns_palette = palette
+            sns_palette = palette,
+            stable = stable_colors
+        )
+
+    elif isinstance(palette, ColorMapper):
+        colors = palette(
+            strata_counts,
+            x,
+            stratum,
+            hue = hue
         )
 
     else:
@@ -304,9 +550,18 @@ def alluvial(
         data,
         x,
         alluvium,
-        stratum
+        stratum,
+        counts = (strata_counts, transitions)
     )
 
+    if order:
+        strata, lodes, groupings = order_strata(
+            strata,
+            lodes,
+            groupings,
+            method = order
+        )
+
     plot_strata(
         strata,
         group_labels,
@@ -323,14 +578,11 @@ def alluvial(
     plot_flows(
         strata,
         lodes,
-        ax
+        ax,
+        rasterized = rasterize_flows,
+        dpi = flow_dpi
     )
 
-    if not show_labels:
-        ax.set_xticks([])
-
-    ax.set_yticks([])
-    for pos in ['top', 'bottom', 'left', 'right']:
-        ax.spines[pos].set_visible(False)
+    style_axes(ax, show_labels)
 
     return ax if not return_fig else (fig, ax)
\ No newline at end of file
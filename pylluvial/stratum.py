@@ -56,6 +56,16 @@ class Stratum:
         height = self.relative_height * scale
         self.height = norm(height, scale) if norm else height
 
+    def get_vertices(self) -> list[list[float]]:
+        top_left = [self.x - self.width / 2, self.y + self.height]
+        top_right = [self.x + self.width / 2, self.y + self.height]
+        bottom_left = [self.x - self.width / 2, self.y]
+        bottom_right = [self.x + self.width / 2, self.y]
+        return [
+            top_left, top_right,
+            bottom_right, bottom_left
+        ]
+
     def get_patch(
         self,
         color: Union[str, tuple[float, float, float, float]],
@@ -64,15 +74,8 @@ class Stratum:
         if not self.color:
             self.color = color
 
-        top_left = [self.x - self.width / 2, self.y + self.height]
-        top_right = [self.x + self.width / 2, self.y + self.height]
-        bottom_left = [self.x - self.width / 2, self.y]
-        bottom_right = [self.x + self.width / 2, self.y]
         patch = Polygon(
-            [
-                top_left, top_right,
-                bottom_right, bottom_left
-            ],
+            self.get_vertices(),
             facecolor = color,
             edgecolor = 'white',
             alpha = alpha
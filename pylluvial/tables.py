@@ -0,0 +1,171 @@
+import pandas as pd
+from typing import Any, Optional
+
+try:
+    import polars as pl
+
+except ImportError:
+    pl = None
+
+try:
+    import pyarrow as pa
+
+except ImportError:
+    pa = None
+
+
+def is_native_table(data: Any) -> bool:
+    """
+    checks if data is a table that is aggregated natively with polars instead of pandas
+
+    :param data:    any object
+
+    :return:        True if data is a polars.DataFrame, polars.LazyFrame or pyarrow.Table
+    """
+    if pl is not None and isinstance(data, (pl.DataFrame, pl.LazyFrame)):
+        return True
+
+    return pa is not None and isinstance(data, pa.Table)
+
+
+def to_lazyframe(data: Any) -> 'pl.LazyFrame':
+    """
+    converts a polars.DataFrame or pyarrow.Table to a polars.LazyFrame without copying the data
+
+    :param data:    polars.DataFrame, polars.LazyFrame or pyarrow.Table
+
+    :return:        polars.LazyFrame
+    """
+    if pl is None:
+        raise ImportError(
+            'polars is required to aggregate pyarrow Tables. Install it with pip install pylluvial[polars]'
+        )
+
+    if isinstance(data, pl.LazyFrame):
+        return data
+
+    if isinstance(data, pl.DataFrame):
+        return data.lazy()
+
+    return pl.from_arrow(data).lazy()
+
+
+def prepare_lazyframe(
+    data: Any,
+    x: str,
+    alluvium: str,
+    stratum: str,
+    hue: Optional[str] = None
+) -> 'pl.LazyFrame':
+    """
+    selects the columns needed for plotting and adds the grouping column. If hue is given
+    strata are split by hue analogous to the pandas code path in alluvial. Rows with missing
+    values in any of these columns are dropped like pandas groupby does
+
+    :param data:        polars.DataFrame, polars.LazyFrame or pyarrow.Table containing data in long format
+    :param x:           categorical column on which to split the data along the x axis
+    :param alluvium:    column from which to compute lode sizes for each stratum
+    :param stratum:     column specifying the strata for each column in x
+    :param hue:         column on which to split each stratum or None
+
+    :return:            polars.LazyFrame
+    """
+    lf = to_lazyframe(data).drop_nulls([x, alluvium, stratum] + ([hue] if hue else []))
+    if hue:
+        return lf.select(
+            pl.col(x),
+            pl.col(alluvium),
+            pl.concat_str(
+                [pl.col(stratum).cast(pl.Utf8), pl.col(hue).cast(pl.Utf8)],
+                separator = '_'
+            ).alias(stratum),
+            pl.col(stratum).cast(pl.Utf8).alias('grouping'),
+            pl.col(hue).cast(pl.Utf8)
+        )
+
+    return lf.select(
+        pl.col(x),
+        pl.col(alluvium),
+        pl.col(stratum),
+        pl.col(stratum).alias('grouping')
+    )
+
+
+def collect_all(lfs: list['pl.LazyFrame']) -> list[pd.DataFrame]:
+    """
+    collects several (small) polars.LazyFrames into pandas.DataFrames without requiring pyarrow.
+    The frames are collected together such that common parts of their plans (e.g. a scan of the
+    same file) are only computed once
+
+    :param lfs: list of polars.LazyFrames
+
+    :return:    list of pandas.DataFrames
+    """
+    return [
+        pd.DataFrame(df.to_dict(as_series = False))
+        for df in pl.collect_all(lfs)
+    ]
+
+
+def count_strata_polars(
+    data: Any,
+    x: str,
+    stratum: str,
+    hue: Optional[str] = None
+) -> 'pl.LazyFrame':
+    """
+    builds the plan counting the number of alluvia in each stratum of each group in x natively with polars
+    (see count_data). The level of each group follows the polars sort order of x
+
+    :param data:    polars.LazyFrame as returned by prepare_lazyframe
+    :param x:       categorical column on which to split the data along the x axis
+    :param stratum: column specifying the strata for each column in x
+    :param hue:     column on which to split each stratum or None
+
+    :return:        polars.LazyFrame with columns x, stratum, grouping, (hue), count and level
+    """
+    keys = [x, stratum, 'grouping'] + ([hue] if hue else [])
+    return (
+        to_lazyframe(data)
+        .group_by(keys)
+        .agg(pl.len().alias('count'))
+        .with_columns((pl.col(x).rank('dense') - 1).cast(pl.Int64).alias('level'))
+        .sort([x, stratum])
+    )
+
+
+def count_transitions_polars(
+    data: Any,
+    x: str,
+    alluvium: str,
+    stratum: str
+) -> 'pl.LazyFrame':
+    """
+    builds the plan counting the alluvia flowing between strata of successive groups in x natively with polars
+    (see count_data). Each group in x is joined with its successor on alluvium in a single self join and the
+    resulting flows are counted with a group by. Like the pandas code path, each row of the target group is
+    counted once for every source stratum that contains its alluvium
+
+    :param data:        polars.LazyFrame as returned by prepare_lazyframe
+    :param x:           categorical column on which to split the data along the x axis
+    :param alluvium:    column from which to compute lode sizes for each stratum
+    :param stratum:     column specifying the strata for each column in x
+
+    :return:            polars.LazyFrame with columns level, source, target and count
+    """
+    lf = to_lazyframe(data).select(
+        (pl.col(x).rank('dense') - 1).cast(pl.Int64).alias('level'),
+        pl.col(alluvium).alias('alluvium'),
+        pl.col(stratum).alias('target')
+    )
+    sources = lf.select(
+        pl.col('level') + 1,
+        pl.col('alluvium'),
+        pl.col('target').alias('source')
+    ).unique()
+    return (
+        sources
+        .join(lf, on = ['level', 'alluvium'])
+        .group_by(['level', 'source', 'target'])
+        .agg(pl.len().alias('count'))
+    )
@@ -2,6 +2,9 @@ import numpy as np
 import itertools as it
 import pandas as pd
 import seaborn as sns
+import matplotlib as mpl
+from functools import lru_cache
+from seaborn.palettes import SEABORN_PALETTES
 from .stratum import Stratum
 from typing import Union, Hashable, Iterable, Optional, Any
 
@@ -24,48 +27,201 @@ class Normalizer:
         return norm * scale if scale else norm
 
 
+@lru_cache(maxsize = None)
+def get_palette(
+    sns_palette: str,
+    n: int
+) -> tuple[tuple[float, float, float], ...]:
+    """
+    returns n colors of a given seaborn palette. Palettes are cached per (sns_palette, n)
+    such that repeated plotting does not regenerate them
+
+    :param sns_palette: string indicating the palette to use for colors (see also seaborn)
+    :param n:           number of colors to generate
+
+    :return:            tuple of RGB tuples
+    """
+    return tuple(sns.color_palette(sns_palette, n))
+
+
+@lru_cache(maxsize = None)
+def get_palette_size(
+    sns_palette: str,
+    continuous_size: int = 20
+) -> int:
+    """
+    returns the native number of colors of a qualitative palette (e.g. 10 for tab10 or deep)
+    or continuous_size for continuous palettes like husl or viridis
+
+    :param sns_palette:     string indicating the palette (see also seaborn)
+    :param continuous_size: number of colors used for continuous palettes
+
+    :return:                number of colors
+    """
+    if sns_palette in SEABORN_PALETTES:
+        return len(SEABORN_PALETTES[sns_palette])
+
+    if sns_palette in mpl.colormaps:
+        cmap = mpl.colormaps[sns_palette]
+        if isinstance(cmap, mpl.colors.ListedColormap) and cmap.N < 256:
+            return cmap.N
+
+    return continuous_size
+
+
+def get_stratum_combinations(
+    data: pd.DataFrame,
+    x: str,
+    stratum: str,
+    hue: Optional[str]
+) -> pd.DataFrame:
+    """
+    returns the unique combinations of x, stratum, grouping (and hue) in data
+
+    :param data:    data to plot in long format
+    :param x:       column in data by which to group along x axis
+    :param stratum: column in data by which to group groups along x axis
+    :param hue:     column in data indicating the grouping of strata within groups or None
+
+    :return:        pandas.DataFrame with one row per stratum in each group
+    """
+    keys = [x, stratum, 'grouping'] + ([hue] if hue else [])
+    return data[keys].drop_duplicates()
+
+
+def build_color_dict(
+    combinations: pd.DataFrame,
+    x: str,
+    stratum: str,
+    codes: np.ndarray,
+    palette: tuple[tuple[float, float, float], ...]
+) -> dict[Hashable, dict[Hashable, tuple[float, float, float]]]:
+    """
+    maps the color codes of each stratum to colors of a palette
+
+    :param combinations:    unique combinations of x and stratum as returned by get_stratum_combinations
+    :param x:               column in combinations by which to group along x axis
+    :param stratum:         column in combinations by which to group groups along x axis
+    :param codes:           palette index for each row in combinations
+    :param palette:         sequence of colors
+
+    :return:                dictionary of colors of the form {group_name: {stratum_name: color}}
+    """
+    color_dict = {}
+    for group_name, stratum_name, code in zip(combinations[x], combinations[stratum], codes):
+        color_dict.setdefault(group_name, {})[stratum_name] = palette[code % len(palette)]
+
+    return color_dict
+
+
+class ColorMapper:
+    """
+    assigns colors to strata from the codes of their grouping and hue labels such that the
+    same label always gets the same color. Each (grouping, hue) label gets a single code that is
+    kept across calls, so passing the same ColorMapper to several alluvial calls gives consistent
+    colors in all plots. Labels seen for the first time get the next free codes in sorted order.
+    The palette has a fixed number of colors such that new labels never change the colors of
+    labels seen before. If there are more labels than colors, colors are reused
+
+    :param palette:     string indicating the palette to use for colors (see also seaborn)
+    :param n_colors:    number of colors in the palette or None to use the native size of qualitative
+                        palettes and 20 colors for continuous palettes like husl (see get_palette_size)
+    """
+    def __init__(
+        self,
+        palette: str = 'husl',
+        n_colors: Optional[int] = None
+    ):
+        self.palette = palette
+        self.n_colors = n_colors or get_palette_size(palette)
+        self.label_codes = {}
+
+    def get_codes(
+        self,
+        combinations: pd.DataFrame,
+        hue: Optional[str] = None
+    ) -> np.ndarray:
+        """
+        returns the color code of each stratum and assigns the next free codes to labels not seen before
+
+        :param combinations:    unique combinations of x and stratum as returned by get_stratum_combinations
+        :param hue:             column in combinations indicating the grouping of strata within groups or None
+
+        :return:                color code for each row in combinations
+        """
+        labels = pd.MultiIndex.from_frame(
+            combinations[['grouping'] + ([hue] if hue else [])]
+        )
+        codes, uniques = labels.factorize(sort = True)
+        mapping = np.array(
+            [self.label_codes.setdefault(label, len(self.label_codes)) for label in uniques],
+            dtype = int
+        )
+        return mapping[codes]
+
+    def __call__(
+        self,
+        data: pd.DataFrame,
+        x: str,
+        stratum: str,
+        hue: Optional[str] = None
+    ) -> dict[Hashable, dict[Hashable, tuple[float, float, float]]]:
+        combinations = get_stratum_combinations(data, x, stratum, hue)
+        codes = self.get_codes(combinations, hue = hue)
+        palette = get_palette(self.palette, self.n_colors)
+
+        return build_color_dict(combinations, x, stratum, codes, palette)
+
+
 def get_color_dict(
     data: pd.DataFrame,
     x: str,
     stratum: str,
     hue: Optional[str],
-    sns_palette: str = 'husl'
-) -> Union[str, dict[Hashable, dict[Hashable, tuple[float, float, float, float]]]]:
+    sns_palette: str = 'husl',
+    stable: bool = False
+) -> dict[Hashable, dict[Hashable, tuple[float, float, float]]]:
     """
-    returns a dict of colors as expected by alluvial
+    returns a dict of colors as expected by alluvial. By default colors are assigned by the
+    position of the stratum grouping within each group in x. If stable is True the same
+    grouping gets the same color in all groups (see also ColorMapper)
 
-    :param data:            data to plot in wide format
+    :param data:            data to plot in long format
     :param x:               column in data by which to group along x axis
     :param stratum:         column in data by which to group groups along x axis
     :param hue:             column in data indicating the grouping of strata within groups or None
     :param sns_palette:     string indicating the palette to use for colors (see also seaborn)
+    :param stable:          if True assigns colors globally instead of per group
 
     :return:                dictionary of colors of the form {group_name: {stratum_name: color}}
     """
 
-    if hue:
-        group_sizes = [group.grouping.nunique() * 2 for _, group in groupby(data, x)]
-
-    else:
-        group_sizes = [group[stratum].nunique() for _, group in groupby(data, x)]
+    if stable:
+        return ColorMapper(sns_palette)(data, x, stratum, hue = hue)
 
-    palette = sns.color_palette(
-        sns_palette,
-        max(group_sizes)
+    combinations = get_stratum_combinations(data, x, stratum, hue)
+    group_keys = combinations[x].to_numpy()
+    grouping_codes = pd.Series(
+        pd.factorize(combinations['grouping'], sort = True)[0],
+        index = combinations.index
     )
+    codes = grouping_codes.groupby(group_keys).rank(method = 'dense').to_numpy(dtype = int) - 1
+    ncolors = codes.max() + 1
+    if hue:
+        stratum_codes = pd.Series(
+            pd.factorize(combinations[stratum], sort = True)[0],
+            index = combinations.index
+        )
+        hue_codes = stratum_codes.groupby(
+            [group_keys, grouping_codes.to_numpy()]
+        ).rank(method = 'dense').to_numpy(dtype = int) - 1
+        nhue = combinations[hue].nunique()
+        codes = codes * nhue + hue_codes
+        ncolors *= nhue
 
-    color_dict = {}
-    for group_name, strata in groupby(data, x):
-        color_dict[group_name] = {}
-        for i, (stratum_group_name, stratum_group) in enumerate(groupby(strata, 'grouping')):
-            if hue:
-                for j, (stratum_name,  _) in enumerate(groupby(stratum_group, stratum)):
-                    color_dict[group_name][stratum_name] = palette[2*i + j]
-
-            else:
-                color_dict[group_name][stratum_group_name] = palette[i]
+    palette = get_palette(sns_palette, ncolors)
 
-    return color_dict
+    return build_color_dict(combinations, x, stratum, codes, palette)
 
 
 def pairwise(iterable: Iterable) -> list[tuple[Any, Any]]:
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+import pylluvial as pa
+from pylluvial.aggregate import prepare_data, aggregate_data
+
+pl = pytest.importorskip('polars')
+pytest.importorskip('pyarrow')
+
+
+def summarize(data, x, alluvium, stratum, n_jobs = None):
+    strata, lodes, group_labels, groupings = aggregate_data(
+        prepare_data(data, x, alluvium, stratum),
+        x,
+        alluvium,
+        stratum,
+        n_jobs = n_jobs
+    )
+    return (
+        [[(s.label, s.relative_height) for s in group] for group in strata],
+        [[lode.tolist() for lode in level] for level in lodes],
+        list(group_labels),
+        groupings
+    )
+
+
+def generate_ordered_data():
+    np.random.seed(0)
+    data = pa.generate_test_data().sample(frac = 1, random_state = 0)
+    data['timepoint'] = pd.Categorical(data['timepoint'], categories = ['t3', 't2', 't1', 't0'], ordered = True)
+    return data
+
+
+@pytest.mark.parametrize(
+    'data',
+    [
+        generate_ordered_data(),
+        # alluvium 1 is in strata 0 and 1 of the first group
+        pd.DataFrame({'timepoint': [0, 0, 0, 1, 1], 'nodename': [1, 1, 2, 1, 2], 'module': [0, 1, 1, 0, 1]})
+    ]
+)
+def test_counting_paths_agree(data):
+    expected = summarize(data, 'timepoint', 'nodename', 'module')
+    polars_data = pl.from_pandas(data)
+    if isinstance(data['timepoint'].dtype, pd.CategoricalDtype):
+        polars_data = polars_data.with_columns(
+            pl.col('timepoint').cast(pl.Enum(data['timepoint'].cat.categories.tolist()))
+        )
+
+    for other in [
+        summarize(data, 'timepoint', 'nodename', 'module', n_jobs = 2),
+        summarize(polars_data, 'timepoint', 'nodename', 'module'),
+        summarize(polars_data.to_arrow(), 'timepoint', 'nodename', 'module')
+    ]:
+        assert other == expected